@@ -2,7 +2,21 @@ import json
 
 from django.http import HttpResponse
 
-from django_browserid.util import LazyEncoder
+from django_browserid.util import lazy_default, LazyEncoder
+
+# orjson is much faster than the built-in json module for the small
+# responses our views return, so use it if it is available.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _dumps(data):
+    """Serialize data to JSON, using orjson if it is available."""
+    if orjson is not None:
+        return orjson.dumps(data, default=lazy_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, cls=LazyEncoder)
 
 
 class JSONResponse(HttpResponse):
@@ -18,6 +32,6 @@ class JSONResponse(HttpResponse):
         :param status:
             HTTP status code to use for this response. Defaults to 200.
         """
-        data_json = json.dumps(data, cls=LazyEncoder)
+        data_json = _dumps(data)
         super(JSONResponse, self).__init__(
             data_json, content_type='application/json', status=status)
@@ -1,3 +1,7 @@
+from django.utils import six
+from django.utils.functional import lazy
+
+from mock import patch
 from nose.tools import eq_
 
 from django_browserid.http import JSONResponse
@@ -18,3 +22,16 @@ class JSONResponseTests(TestCase):
         response = JSONResponse({'blah': 'foo', 'bar': 7}, status=404)
         self.assert_json_equals(response.content, {'blah': 'foo', 'bar': 7})
         eq_(response.status_code, 404)
+
+    def test_lazy(self):
+        """Lazy strings should be forced to text in the response body."""
+        lazy_str = lazy(lambda: 'foo', six.text_type)()
+        response = JSONResponse({'blah': lazy_str})
+        self.assert_json_equals(response.content, {'blah': 'foo'})
+
+    def test_no_orjson(self):
+        """If orjson isn't available, fall back to the json module."""
+        lazy_str = lazy(lambda: 'foo', six.text_type)()
+        with patch('django_browserid.http.orjson', None):
+            response = JSONResponse({'blah': lazy_str, 'bar': 7})
+        self.assert_json_equals(response.content, {'blah': 'foo', 'bar': 7})
@@ -9,7 +9,7 @@ from mock import Mock, patch
 from nose.tools import eq_
 
 from django_browserid.tests import TestCase
-from django_browserid.util import import_from_setting, LazyEncoder
+from django_browserid.util import import_from_setting, lazy_default, LazyEncoder
 
 
 def _lazy_string():
@@ -24,6 +24,16 @@ class TestLazyEncoder(TestCase):
         eq_('["foo", "blah"]', thing_json)
 
 
+class LazyDefaultTests(TestCase):
+    def test_lazy(self):
+        eq_(lazy_default(lazy_string), 'blah')
+
+    def test_not_lazy(self):
+        """If the object isn't a Promise, raise TypeError."""
+        with self.assertRaises(TypeError):
+            lazy_default(object())
+
+
 class ImportFromSettingTests(TestCase):
     def test_no_setting(self):
         """If the setting doesn't exist, raise ImproperlyConfigured."""
@@ -2,17 +2,21 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this
 # file, You can obtain one at http://mozilla.org/MPL/2.0/.
 from django.contrib import auth
+from django.middleware.csrf import CsrfViewMiddleware
 from django.test.client import RequestFactory
-from django.utils import six
-from django.utils.functional import lazy
 
 from mock import Mock, patch, PropertyMock
 from nose.tools import eq_, ok_
 
-from django_browserid import BrowserIDException, views
+from django_browserid import BrowserIDException, MockVerifier, views
 from django_browserid.tests import mock_browserid, TestCase
 
 
+# RequestFactory builds a fresh request on every call, so a single
+# instance can be shared by all the tests in this module.
+_factory = RequestFactory()
+
+
 class JSONViewTests(TestCase):
     def test_http_method_not_allowed(self):
         class TestView(views.JSONView):
@@ -53,16 +57,83 @@ class JSONViewTests(TestCase):
         actual_methods = set(response['Allow'].split(', '))
         ok_(expected_methods.issubset(actual_methods))
 
+    def test_http_method_not_allowed_subclass(self):
+        """
+        The cached Allow header should not leak from a view to its
+        subclasses.
+        """
+        class GetView(views.JSONView):
+            def get(self, request, *args, **kwargs):
+                return 'asdf'
+
+        class GetPostView(GetView):
+            def post(self, request, *args, **kwargs):
+                return 'qwer'
+
+        response = GetView().http_method_not_allowed()
+        ok_('POST' not in response['Allow'].split(', '))
+
+        response = GetPostView().http_method_not_allowed()
+        ok_(set(['GET', 'POST']).issubset(set(response['Allow'].split(', '))))
+
+    def test_http_method_not_allowed_then_options(self):
+        """
+        Caching the Allow header shouldn't break the OPTIONS handling
+        that View provides.
+        """
+        class GetView(views.JSONView):
+            def get(self, request, *args, **kwargs):
+                return 'asdf'
+
+        GetView().http_method_not_allowed()
+
+        response = GetView().options(_factory.options('/'))
+        eq_(response.status_code, 200)
+        ok_('GET' in response['Allow'].split(', '))
+
+    def test_http_method_not_allowed_initkwarg(self):
+        """
+        If http_method_names is passed to as_view, only list the methods
+        allowed for that instance.
+        """
+        class GetPostView(views.JSONView):
+            def get(self, request, *args, **kwargs):
+                return 'asdf'
+
+            def post(self, request, *args, **kwargs):
+                return 'qwer'
+
+        # Fill the class-level cache first to make sure it isn't used.
+        GetPostView().http_method_not_allowed()
+
+        view = GetPostView.as_view(http_method_names=['get'])
+        response = view(_factory.post('/'))
+        eq_(response.status_code, 405)
+        eq_(response['Allow'], 'GET')
+
 
 class GetNextTests(TestCase):
     def setUp(self):
-        self.factory = RequestFactory()
+        self.factory = _factory
 
     def test_no_param(self):
         """If next isn't in the POST params, return None."""
         request = self.factory.post('/')
         eq_(views._get_next(request), None)
 
+    def test_no_param_skips_safety_check(self):
+        """
+        If next isn't in the POST params, don't bother checking if it is
+        safe.
+        """
+        request = self.factory.post('/')
+        request.get_host = Mock()
+
+        with patch.object(views, 'is_safe_url') as is_safe_url:
+            eq_(views._get_next(request), None)
+        ok_(not is_safe_url.called)
+        ok_(not request.get_host.called)
+
     def test_is_safe(self):
         """Return the value of next if it is considered safe."""
         request = self.factory.post('/', {'next': '/asdf'})
@@ -83,8 +154,25 @@ class GetNextTests(TestCase):
 
 
 class VerifyTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(VerifyTests, cls).setUpClass()
+        cls._mock_browserid = mock_browserid(None)
+        cls.get_verifier = cls._mock_browserid.__enter__()
+        cls._login_patch = patch('django_browserid.views.auth.login')
+        cls.login = cls._login_patch.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._login_patch.stop()
+        cls._mock_browserid.__exit__(None, None, None)
+        super(VerifyTests, cls).tearDownClass()
+
     def setUp(self):
-        self.factory = RequestFactory()
+        self.factory = _factory
+        self.verify_view = views.Verify.as_view()
+        self.get_verifier.return_value = MockVerifier(None)
+        self.login.reset_mock()
 
     def verify(self, request_type, **kwargs):
         """
@@ -96,11 +184,7 @@ class VerifyTests(TestCase):
         else:
             request = self.factory.post('/browserid/verify', kwargs)
 
-        verify_view = views.Verify.as_view()
-        with patch.object(auth, 'login'):
-            response = verify_view(request)
-
-        return response
+        return self.verify_view(request)
 
     def test_no_assertion(self):
         """If no assertion is given, return a failure result."""
@@ -109,7 +193,6 @@ class VerifyTests(TestCase):
         eq_(response.status_code, 403)
         self.assert_json_equals(response.content, {'redirect': '/fail'})
 
-    @mock_browserid(None)
     def test_auth_fail(self):
         """If authentication fails, redirect to the failure URL."""
         with self.settings(LOGIN_REDIRECT_URL_FAILURE='/fail'):
@@ -117,7 +200,6 @@ class VerifyTests(TestCase):
         eq_(response.status_code, 403)
         self.assert_json_equals(response.content, {'redirect': '/fail'})
 
-    @mock_browserid(None)
     @patch('django_browserid.views.logger.error')
     @patch('django_browserid.views.auth.authenticate')
     def test_authenticate_browserid_exception(self, authenticate, logger_error):
@@ -133,6 +215,19 @@ class VerifyTests(TestCase):
         eq_(response, mock_failure.return_value)
         mock_failure.assert_called_with(excpt)
 
+    @patch('django_browserid.views.auth.authenticate')
+    def test_auth_inactive_user(self, authenticate):
+        """If the authenticated user is inactive, return a failure result."""
+        authenticate.return_value = Mock(is_active=False)
+
+        view = views.Verify()
+        view.request = self.factory.post('/browserid/verify', {'assertion': 'asdf'})
+        with patch.object(views.Verify, 'login_failure') as mock_failure:
+            response = view.post()
+        eq_(response, mock_failure.return_value)
+        mock_failure.assert_called_with()
+        ok_(view.user is None)
+
     def test_login_failure_log_exception(self):
         """If login_failure is passed an exception, it should log it."""
         excpt = BrowserIDException(Exception('hsakjw'))
@@ -141,7 +236,6 @@ class VerifyTests(TestCase):
             views.Verify().login_failure(excpt)
         logger_error.assert_called_with(excpt)
 
-    @mock_browserid(None)
     @patch('django_browserid.views.logger.error')
     @patch('django_browserid.views.auth.authenticate')
     def test_authenticate_any_exception(self, authenticate, logger_error):
@@ -157,18 +251,16 @@ class VerifyTests(TestCase):
         eq_(response, mock_failure.return_value)
         mock_failure.assert_called_with(excpt)
 
-    @mock_browserid('test@example.com')
     def test_auth_success_redirect_success(self):
         """If authentication succeeds, redirect to the success URL."""
+        self.get_verifier.return_value = MockVerifier('test@example.com')
         user = auth.models.User.objects.create_user('asdf', 'test@example.com')
 
         request = self.factory.post('/browserid/verify', {'assertion': 'asdf'})
         with self.settings(LOGIN_REDIRECT_URL='/success'):
-            with patch('django_browserid.views.auth.login') as login:
-                verify = views.Verify.as_view()
-                response = verify(request)
+            response = self.verify_view(request)
 
-        login.assert_called_with(request, user)
+        self.login.assert_called_with(request, user)
         eq_(response.status_code, 200)
         self.assert_json_equals(response.content,
                                 {'email': 'test@example.com', 'redirect': '/success'})
@@ -179,8 +271,7 @@ class VerifyTests(TestCase):
             self.verify('post')
         ok_(sanity_checks.called)
 
-    @patch('django_browserid.views.auth.login')
-    def test_login_success_no_next(self, *args):
+    def test_login_success_no_next(self):
         """
         If _get_next returns None, use success_url for the redirect
         parameter.
@@ -196,8 +287,7 @@ class VerifyTests(TestCase):
         self.assert_json_equals(response.content, {'email': 'a@b.com', 'redirect': '/?asdf'})
         _get_next.assert_called_with(view.request)
 
-    @patch('django_browserid.views.auth.login')
-    def test_login_success_next(self, *args):
+    def test_login_success_next(self):
         """
         If _get_next returns a URL, use it for the redirect parameter.
         """
@@ -214,24 +304,35 @@ class VerifyTests(TestCase):
 
 
 class LogoutTests(TestCase):
-    def setUp(self):
-        self.factory = RequestFactory()
+    @classmethod
+    def setUpClass(cls):
+        super(LogoutTests, cls).setUpClass()
+        cls._get_next_patch = patch('django_browserid.views._get_next')
+        cls._get_next = cls._get_next_patch.start()
+        cls._logout_patch = patch('django_browserid.views.auth.logout')
+        cls.logout = cls._logout_patch.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._logout_patch.stop()
+        cls._get_next_patch.stop()
+        super(LogoutTests, cls).tearDownClass()
 
-        _get_next_patch = patch('django_browserid.views._get_next')
-        self._get_next = _get_next_patch.start()
-        self.addCleanup(_get_next_patch.stop)
+    def setUp(self):
+        self.factory = _factory
+        self.logout_view = views.Logout.as_view()
+        self._get_next.reset_mock()
+        self._get_next.return_value = None
+        self.logout.reset_mock()
 
     def test_redirect(self):
         """Include LOGOUT_REDIRECT_URL in the response."""
         request = self.factory.post('/')
-        logout = views.Logout.as_view()
-        self._get_next.return_value = None
 
         with patch.object(views.Logout, 'redirect_url', '/test/foo'):
-            with patch('django_browserid.views.auth.logout') as auth_logout:
-                response = logout(request)
+            response = self.logout_view(request)
 
-        auth_logout.assert_called_with(request)
+        self.logout.assert_called_with(request)
         eq_(response.status_code, 200)
         self.assert_json_equals(response.content, {'redirect': '/test/foo'})
 
@@ -240,45 +341,60 @@ class LogoutTests(TestCase):
         If _get_next returns a URL, use it for the redirect parameter.
         """
         request = self.factory.post('/')
-        logout = views.Logout.as_view()
         self._get_next.return_value = '/test/bar'
 
         with patch.object(views.Logout, 'redirect_url', '/test/foo'):
-            with patch('django_browserid.views.auth.logout'):
-                response = logout(request)
+            response = self.logout_view(request)
 
         self.assert_json_equals(response.content, {'redirect': '/test/bar'})
 
 
 class CsrfTokenTests(TestCase):
     def setUp(self):
-        self.factory = RequestFactory()
+        self.factory = _factory
         self.view = views.CsrfToken()
 
-    def test_lazy_token_called(self):
-        """
-        If the csrf_token variable in the RequestContext is a lazy
-        callable, make sure it is called during the view.
-        """
-        global _lazy_csrf_token_called
-        _lazy_csrf_token_called = False
+    def test_token(self):
+        """Return the CSRF token for the request as the response body."""
+        request = self.factory.get('/browserid/csrf/')
+        with patch('django_browserid.views._get_csrf', return_value='asdf') as _get_csrf:
+            response = self.view.get(request)
 
-        # I'd love to use a Mock here instead, but lazy doesn't behave
-        # well with Mocks for some reason.
-        def _lazy_csrf_token():
-            global _lazy_csrf_token_called
-            _lazy_csrf_token_called = True
-            return 'asdf'
-        csrf_token = lazy(_lazy_csrf_token, six.text_type)()
+        eq_(response.status_code, 200)
+        eq_(response.content, b'asdf')
+        _get_csrf.assert_called_with(request)
 
+    def test_no_token(self):
+        """If no CSRF token is available, return an empty body."""
         request = self.factory.get('/browserid/csrf/')
-        with patch('django_browserid.views.RequestContext') as RequestContext:
-            RequestContext.return_value = {'csrf_token': csrf_token}
+        with patch('django_browserid.views._get_csrf', return_value=None):
             response = self.view.get(request)
 
         eq_(response.status_code, 200)
+        eq_(response.content, b'')
+
+    def test_session_csrf_token(self):
+        """
+        If session_csrf's middleware stored a token on the request,
+        return it.
+        """
+        request = self.factory.get('/browserid/csrf/')
+        request.csrf_token = 'asdf'
+        response = self.view.get(request)
         eq_(response.content, b'asdf')
-        ok_(_lazy_csrf_token_called)
+
+    def test_django_csrf_token(self):
+        """
+        If there is no token on the request, return the token from
+        Django's CSRF middleware.
+        """
+        request = self.factory.get('/browserid/csrf/')
+        CsrfViewMiddleware().process_view(request, None, (), {})
+        response = self.view.get(request)
+
+        token = request.META['CSRF_COOKIE']
+        ok_(token)
+        eq_(response.content, token.encode('ascii'))
 
     def test_never_cache(self):
         request = self.factory.get('/browserid/csrf/')
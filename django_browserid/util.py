@@ -14,15 +14,26 @@ except ImportError:
     from django.utils.encoding import force_text  # Python 3
 
 
+def lazy_default(obj):
+    """
+    JSON encoder fallback that turns Promises into unicode strings to
+    support functions like ugettext_lazy and reverse_lazy.
+
+    :raises:
+        TypeError if obj is not a Promise.
+    """
+    if isinstance(obj, Promise):
+        return force_text(obj)
+    raise TypeError('{0!r} is not JSON serializable'.format(obj))
+
+
 class LazyEncoder(json.JSONEncoder):
     """
     JSONEncoder that turns Promises into unicode strings to support functions
     like ugettext_lazy and reverse_lazy.
     """
     def default(self, obj):
-        if isinstance(obj, Promise):
-            return force_text(obj)
-        return super(LazyEncoder, self).default(obj)
+        return lazy_default(obj)
 
 
 def import_from_setting(setting):
@@ -6,24 +6,48 @@ import logging
 from django.conf import settings
 from django.contrib import auth
 from django.http import HttpResponse
-from django.template import RequestContext
-from django.utils import six
+from django.middleware.csrf import get_token
 from django.utils.http import is_safe_url
 from django.views.decorators.cache import never_cache
 from django.views.generic import View
 
-from django_browserid.base import BrowserIDException, sanity_checks
+from django_browserid.base import sanity_checks
 from django_browserid.http import JSONResponse
 
 
 logger = logging.getLogger(__name__)
 
 
+def _get_csrf(request):
+    """
+    Get the CSRF token for the request. Different CSRF libraries store
+    the token in different places: session_csrf's middleware sets it on
+    the request, otherwise we fall back to Django's built-in CSRF.
+    """
+    return getattr(request, 'csrf_token', None) or get_token(request)
+
+
 class JSONView(View):
+    def _allowed_methods_header(self):
+        """
+        Comma-separated list of the HTTP methods this view handles. The
+        list normally only depends on the class, so it is computed once
+        and cached on the class itself. Views given http_method_names
+        through as_view() compute it from the instance instead.
+        """
+        if 'http_method_names' in self.__dict__:
+            return ', '.join(m.upper() for m in self.http_method_names if hasattr(self, m))
+
+        cls = type(self)
+        header = cls.__dict__.get('_allowed_methods_header_cache')
+        if header is None:
+            header = ', '.join(m.upper() for m in cls.http_method_names if hasattr(cls, m))
+            cls._allowed_methods_header_cache = header
+        return header
+
     def http_method_not_allowed(self, *args, **kwargs):
         response = JSONResponse({'error': 'Method not allowed.'}, status=405)
-        allowed_methods = [m.upper() for m in self.http_method_names if hasattr(self, m)]
-        response['Allow'] = ', '.join(allowed_methods)
+        response['Allow'] = self._allowed_methods_header()
         return response
 
 
@@ -36,6 +60,9 @@ def _get_next(request):
         The next parameter or None if it was not found or invalid.
     """
     next = request.POST.get('next')
+    if not next:
+        return None
+
     if is_safe_url(next, host=request.get_host()):
         return next
     else:
@@ -47,6 +74,10 @@ class Verify(JSONView):
     Send an assertion to the remote verification service, and log the
     user in upon success.
     """
+    #: User that was authenticated by the assertion. Only set once
+    #: authentication succeeds; None during login failures.
+    user = None
+
     @property
     def failure_url(self):
         """
@@ -101,11 +132,12 @@ class Verify(JSONView):
             return self.login_failure()
 
         try:
-            self.user = auth.authenticate(request=self.request, assertion=assertion)
+            user = auth.authenticate(request=self.request, assertion=assertion)
         except Exception as e:
             return self.login_failure(e)
 
-        if self.user and self.user.is_active:
+        if user is not None and user.is_active:
+            self.user = user
             return self.login_success()
 
         return self.login_failure()
@@ -122,18 +154,7 @@ class CsrfToken(JSONView):
     """Fetch a CSRF token for the frontend JavaScript."""
     @never_cache
     def get(self, request):
-        # Different CSRF libraries (namely session_csrf) store the CSRF
-        # token in different places. The only way to retrieve the token
-        # that works with both the built-in CSRF and session_csrf is to
-        # pull it from the template context processors via
-        # RequestContext.
-        context = RequestContext(request)
-
-        # csrf_token might be a lazy value that triggers side-effects,
-        # so we need to force it to a string.
-        csrf_token = six.text_type(context.get('csrf_token', ''))
-
-        return HttpResponse(csrf_token)
+        return HttpResponse(_get_csrf(request) or '')
 
 
 class Logout(JSONView):